@@ -1,44 +1,63 @@
 import os
 import re
 
+from fsutil import BUF_SIZE, iter_java_files, run_per_file, write_atomic
+
+# Matches comments like: //line 123 (plus the whitespace before them, which
+# the per-line version used to drop with rstrip())
+_COMMENT_RE = re.compile(r'[^\S\n]*//[^\n]*')
+
+
+def _process_one(java_path):
+    dirpath, filename = os.path.split(java_path)
+    expected_path = os.path.join(
+        dirpath, filename.replace(".java", "-expected.txt")
+    )
+    print(f"Processing: {java_path}")
+
+    with open(java_path, "rb", buffering=BUF_SIZE) as f:
+        data = f.read()
+    if b"//" not in data:
+        # Nothing to strip: leave the file untouched, but make sure it has an
+        # (empty) expected file, as it is a true-negative case. An existing
+        # expected file is kept, so reruns do not blank it
+        try:
+            open(expected_path, "xb").close()
+        except FileExistsError:
+            pass
+        return
+
+    # Decode with universal newlines, as reading in text mode would
+    text = data.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    # Single pass over the whole file: collect the line of every
+    # //line XX comment, then remove the comment part only
+    matches = list(_COMMENT_RE.finditer(text))
+    line_numbers = []
+    lineno, pos = 1, 0
+    for m in matches:
+        # Count only the newlines since the previous match, keeping this linear
+        lineno += text.count("\n", pos, m.start())
+        pos = m.start()
+        line_numbers.append(lineno)
+    cleaned_text = _COMMENT_RE.sub("", text)
+    if matches and matches[-1].end() == len(text):
+        # A comment on the last line without trailing newline
+        cleaned_text += "\n"
+
+    # Write expected file
+    with open(expected_path, "wb", buffering=BUF_SIZE) as f:
+        f.write("".join(f"{filename}:{num}\n" for num in line_numbers).encode("utf-8"))
+
+    # Replace the java file with its cleaned version
+    write_atomic(java_path, cleaned_text.encode("utf-8"))
+
+
 def process_java_files(root_dir):
-    # Matches comments like: //line 123
-    comment_pattern = re.compile(r'//.*$')
-
-    for dirpath, _, filenames in os.walk(root_dir):
-        for filename in filenames:
-            if filename.endswith(".java"):
-                java_path = os.path.join(dirpath, filename)
-                expected_path = os.path.join(
-                    dirpath, filename.replace(".java", "-expected.txt")
-                )
-                print(f"Processing: {java_path}")
-
-                with open(java_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-
-                line_numbers = []
-                cleaned_lines = []
-
-                for i, line in enumerate(lines, start=1):
-                    match = comment_pattern.search(line)
-                    if match:
-                        line_numbers.append(i)
-                        # Remove the //line XX comment part only
-                        cleaned_line = comment_pattern.sub("", line)
-                        cleaned_lines.append(cleaned_line.rstrip() + "\n")
-                    else:
-                        cleaned_lines.append(line)
-
-                # Write expected file
-                with open(expected_path, "w", encoding="utf-8") as f:
-                    for num in line_numbers:
-                        f.write(f"{filename}:{num}\n")
-
-                # Overwrite cleaned java file
-                with open(java_path, "w", encoding="utf-8") as f:
-                    f.writelines(cleaned_lines)
+    run_per_file(_process_one, iter_java_files(root_dir))
 
 
 target_directory = "tests/fraunhofer-suite"
-process_java_files(target_directory)
\ No newline at end of file
+process_java_files(target_directory)
@@ -0,0 +1,76 @@
+"""
+Filesystem helpers shared by the scripts in this repository.
+
+Unlike comments_remover.py and line_numberer.py, which do their work on
+import, this module has no side effects and can be imported from anywhere.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+# I/O buffer size for reading and writing source and result files
+BUF_SIZE = 128 * 1024
+
+
+def iter_java_files(root: str, ignore_case: bool = False) -> Iterator[str]:
+    """Yield paths of .java files under root recursively.
+
+    Uses os.scandir so directory entries carry their cached file type and
+    no extra stat() is needed per file. Symlinked directories are not
+    followed. With ignore_case, names like 'Foo.JAVA' match as well.
+    """
+    pending = deque([root])
+    while pending:
+        try:
+            it = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                    continue
+                name = entry.name.lower() if ignore_case else entry.name
+                if name.endswith(".java") and entry.is_file():
+                    yield entry.path
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write bytes to a temp file next to path, then rename it over path.
+
+    The temp file gets path's permission bits first, so the rewrite keeps
+    read-only or executable modes. A file with several hardlinks is
+    rewritten in place instead, since a rename would detach it from its
+    other names.
+    """
+    if os.stat(path).st_nlink > 1:
+        with open(path, "wb", buffering=BUF_SIZE) as f:
+            f.write(data)
+        return
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb", buffering=BUF_SIZE) as f:
+            f.write(data)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def run_per_file(func: Callable[[str], object], paths: Iterable[str]) -> None:
+    """Call func on every path using a thread pool, re-raising the first error.
+
+    Meant for independent per-file read-modify-write jobs, which mostly wait
+    on I/O, so more threads than CPUs are used.
+    """
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for _ in executor.map(func, paths):
+            pass
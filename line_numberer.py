@@ -1,27 +1,26 @@
-import os
+from fsutil import BUF_SIZE, iter_java_files, run_per_file, write_atomic
 
 
-def prepend_line_numbers_to_java_files(root_dir):
-    for dirpath, _, filenames in os.walk(root_dir):
-        for filename in filenames:
-            if filename.endswith(".java"):
-                file_path = os.path.join(dirpath, filename)
-                print(f"Processing: {file_path}")
+def _process_one(file_path):
+    print(f"Processing: {file_path}")
+
+    # Read file content
+    with open(file_path, "r", encoding="utf-8", buffering=BUF_SIZE) as f:
+        lines = f.readlines()
 
-                # Read file content
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
+    # Prepend line numbers; blank (whitespace-only) lines get just the marker
+    modified_text = "".join(
+        f"/*line {i}*/\n" if line.isspace() else f"/*line {i}*/ {line}"
+        for i, line in enumerate(lines, 1)
+    )
 
-                # Prepend line numbers
-                modified_lines = [
-                    f"/*line {i + 1}*/ {line}" if line.strip() != "" else f"/*line {i + 1}*/\n"
-                    for i, line in enumerate(lines)
-                ]
+    # Write back in a single call
+    write_atomic(file_path, modified_text.encode("utf-8"))
 
-                # Write back
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.writelines(modified_lines)
+
+def prepend_line_numbers_to_java_files(root_dir):
+    run_per_file(_process_one, iter_java_files(root_dir))
 
 
 target_directory = "tests/fraunhofer-suite"  # Change this to your directory path
-prepend_line_numbers_to_java_files(target_directory)
\ No newline at end of file
+prepend_line_numbers_to_java_files(target_directory)
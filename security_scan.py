@@ -9,6 +9,7 @@ Usage:
 Defaults:
   - If no path is given, scans tests/java/BenchmarkTest00001.java
   - Model can be configured via env var MODEL (default: gpt-4o-mini)
+  - Number of concurrent LLM requests via env var SCAN_CONCURRENCY (default: 8)
   - OpenAI-compatible endpoint:
       * API key via env var OPENAI_API_KEY
       * Base URL via env var OPENAI_BASE_URL (default: https://litellm.labs.jb.gg/)
@@ -17,33 +18,80 @@ This script uses the OpenAI-compatible client, so it can work with a LiteLLM Pro
 """
 from __future__ import annotations
 
+import functools
+import itertools
 import json
+import mmap
 import os
+import random
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Dict
 
 try:
     import openai
+    import httpx  # installed together with openai
 except Exception as e:
     print("The 'openai' package is required. Install with: pip install openai", file=sys.stderr)
     raise
 
+from fsutil import BUF_SIZE, iter_java_files
+
+
+# Sources at least this large are decoded straight from a memory map
+_MMAP_THRESHOLD = 64 * 1024
+
+# Shared decoder used to pull JSON objects out of free-form LLM output
+_JSON_DECODER = json.JSONDecoder()
+
+# Result directories already known to exist, so write_json checks each only once
+_KNOWN_DIRS: set[str] = set()
+
+# Retry policy for transient API failures (connection errors, HTTP 408/409/429 and 5xx)
+_MAX_ATTEMPTS = 5
+_BACKOFF_INITIAL = 1.0
+_BACKOFF_MAX = 30.0
+
 
 def read_file(path: str) -> str:
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        return f.read()
+    with open(path, "rb", buffering=BUF_SIZE) as f:
+        if os.fstat(f.fileno()).st_size >= _MMAP_THRESHOLD:
+            # Decode from the mapping directly, skipping the intermediate bytes copy
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8", "replace")
+        else:
+            text = f.read().decode("utf-8", "replace")
+    # Translate line endings like a text-mode read would
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
 
 
 def read_prompt_file(path: str) -> str | None:
     """Try to read a prompt template file; return None if missing or unreadable."""
     try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
+        with open(path, "r", encoding="utf-8", errors="replace", buffering=BUF_SIZE) as f:
             return f.read()
     except Exception:
         return None
 
 
+@functools.lru_cache(maxsize=4)
+def _load_prompt(path: str) -> str | None:
+    """Read a prompt template once; later calls for the same path hit the cache."""
+    return read_prompt_file(path)
+
+
+@functools.lru_cache(maxsize=4)
+def _system_message(system_prompt: str) -> Dict[str, Any]:
+    """Build the system message once; the same dict is shared by every request."""
+    return {
+        "role": "system",
+        "content": system_prompt,
+    }
+
+
 def build_messages(code: str, filename: str) -> list[Dict[str, Any]]:
     # Resolve prompts directory (can be overridden via PROMPTS_DIR env var)
     prompts_dir = os.getenv("PROMPTS_DIR", os.path.join(os.path.dirname(__file__), "prompts"))
@@ -53,26 +101,20 @@ def build_messages(code: str, filename: str) -> list[Dict[str, Any]]:
     # Prompts must be provided via files; no fallbacks are used.
 
     # Prepare a line-numbered version of the code so the model can reference exact lines
-    numbered_lines = []
-    for idx, line in enumerate(code.splitlines(), start=1):
-        numbered_lines.append(f"{idx}: {line}")
-    numbered_code = "\n".join(numbered_lines)
+    numbered_code = "\n".join(map("{}: {}".format, itertools.count(1), code.splitlines()))
 
     # Load prompts strictly from files; exit if missing/unreadable
-    system_prompt = read_prompt_file(system_prompt_path)
+    system_prompt = _load_prompt(system_prompt_path)
     if not system_prompt:
         print(f"Error: prompt file missing or unreadable: {system_prompt_path}", file=sys.stderr)
         sys.exit(1)
-    user_template = read_prompt_file(user_prompt_path)
+    user_template = _load_prompt(user_prompt_path)
     if not user_template:
         print(f"Error: prompt file missing or unreadable: {user_prompt_path}", file=sys.stderr)
         sys.exit(1)
 
     # System message defines assistant behavior and scope of analysis
-    system = {
-        "role": "system",
-        "content": system_prompt,
-    }
+    system = _system_message(system_prompt)
 
     # User message contains the concrete instruction and the code to analyze
     try:
@@ -106,26 +148,63 @@ def parse_assistant_content(resp: Any) -> str:
 
 
 def extract_json_block(text: str) -> Dict[str, Any] | None:
-    """Attempt to extract the first top-level JSON object from the text."""
+    """Attempt to extract the first top-level JSON object from the text.
+
+    Decoding starts at each '{' in turn using the C-accelerated
+    JSONDecoder.raw_decode, which also handles braces inside strings.
+    """
     start = text.find("{")
-    if start == -1:
-        return None
-    # naive brace-matching to find end of top-level object
-    depth = 0
-    for i in range(start, len(text)):
-        ch = text[i]
-        if ch == '{':
-            depth += 1
-        elif ch == '}':
-            depth -= 1
-            if depth == 0:
-                try:
-                    return json.loads(text[start:i+1])
-                except Exception:
-                    return None
+    while start != -1:
+        try:
+            obj, _end = _JSON_DECODER.raw_decode(text, start)
+            return obj
+        except json.JSONDecodeError:
+            start = text.find("{", start + 1)
     return None
 
 
+def _is_transient(exc: Exception) -> bool:
+    """Return True for the failures the SDK itself retries by default."""
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    # 408 Request Timeout and 409 Conflict (lock timeout) are retried as well
+    return isinstance(exc, openai.APIStatusError) and (
+        exc.status_code in (408, 409) or exc.status_code >= 500
+    )
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Return the delay in seconds requested by a Retry-After header, if any."""
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def create_completion(client: Any, model: str, messages: list[Dict[str, Any]]) -> Any:
+    """Request a chat completion, retrying transient failures.
+
+    Waits follow the server's Retry-After when given, otherwise exponential
+    backoff with jitter so concurrent workers do not retry in lockstep.
+    """
+    for attempt in range(_MAX_ATTEMPTS):
+        try:
+            return client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.2,
+            )
+        except (openai.APIConnectionError, openai.APIStatusError) as e:
+            if attempt + 1 == _MAX_ATTEMPTS or not _is_transient(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = _BACKOFF_INITIAL * 2 ** attempt + random.uniform(0, 1)
+            time.sleep(min(delay, _BACKOFF_MAX))
+
+
 def analyze_file(filename: str, client: Any, model: str) -> tuple[Dict[str, Any] | None, str]:
     """Run the LLM on a single file and return (parsed_json_or_none, raw_text)."""
     try:
@@ -135,11 +214,7 @@ def analyze_file(filename: str, client: Any, model: str) -> tuple[Dict[str, Any]
         return None, ""
 
     messages = build_messages(code, filename)
-    resp = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.2,
-    )
+    resp = create_completion(client, model, messages)
     content = parse_assistant_content(resp)
     data = extract_json_block(content)
     return data, content
@@ -159,8 +234,8 @@ def actual_path_for(src_path: str) -> str:
 
 def load_json(path: str) -> Dict[str, Any] | None:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb", buffering=BUF_SIZE) as f:
+            return json.loads(f.read())
     except Exception:
         return None
 
@@ -168,10 +243,13 @@ def load_json(path: str) -> Dict[str, Any] | None:
 def write_json(path: str, data: Dict[str, Any]) -> bool:
     try:
         parent = os.path.dirname(path)
-        if parent and not os.path.isdir(parent):
-            os.makedirs(parent, exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if parent and parent not in _KNOWN_DIRS:
+            if not os.path.isdir(parent):
+                os.makedirs(parent, exist_ok=True)
+            _KNOWN_DIRS.add(parent)
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        with open(path, "wb", buffering=BUF_SIZE) as f:
+            f.write(payload)
         return True
     except Exception as e:
         print(f"Error writing JSON to {path}: {e}", file=sys.stderr)
@@ -205,6 +283,21 @@ def compare_results(actual: Dict[str, Any] | None, expected: Dict[str, Any] | No
     return False, msg
 
 
+def build_http_client() -> httpx.Client:
+    """Create one pooled, keep-alive HTTP client shared by all LLM requests.
+
+    Built on the SDK's DefaultHttpxClient, so its defaults (timeouts,
+    redirect following) are kept and only the pool settings change. Uses
+    HTTP/2 when the optional 'h2' package is installed, so concurrent
+    requests are multiplexed over a single connection.
+    """
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+    try:
+        return openai.DefaultHttpxClient(http2=True, limits=limits)
+    except ImportError:
+        return openai.DefaultHttpxClient(limits=limits)
+
+
 def find_test_dir() -> str:
     """Return the root tests directory, preferring 'tests' then 'test'."""
     candidates = ["tests", "test"]
@@ -215,25 +308,60 @@ def find_test_dir() -> str:
 
 
 def iter_source_files(root: str):
-    """Yield .java source files under root recursively, skipping expected JSON files."""
-    for dirpath, dirnames, filenames in os.walk(root):
-        for name in filenames:
-            if name.endswith("-expected.json"):
-                continue
-            if name.lower().endswith(".java"):
-                yield os.path.join(dirpath, name)
-
-
-def main() -> None:
-    model = os.getenv("MODEL", "gpt-4o-mini")
-    api_key = os.getenv("OPENAI_API_KEY")
-    base_url = os.getenv("OPENAI_BASE_URL", "https://litellm.labs.jb.gg/")
+    """Yield .java source files under root recursively (extension matched case-insensitively)."""
+    return iter_java_files(root, ignore_case=True)
+
+
+def report_failure(src: str, error: Exception) -> str:
+    """Record a file whose analysis raised; returns the status "fail"."""
+    print(f"Analysis failed: {error}")
+    actual_path = actual_path_for(src)
+    if write_json(actual_path, {"file": src, "issues": [], "raw": f"Error: {error}"}):
+        print(f"Wrote actual result: {actual_path}")
+    else:
+        print(f"Failed to write actual result: {actual_path}", file=sys.stderr)
+    print("Result: FAIL")
+    return "fail"
+
+
+def report_result(src: str, actual: Dict[str, Any] | None, raw: str) -> str:
+    """Write the actual result of one file and compare it with the expected one.
+
+    Returns "pass", "fail" or "missing" (expected file created from the
+    actual result, counted as a pass).
+    """
+    # Always write the actual result for each file
+    actual_path = actual_path_for(src)
+    actual_to_write: Dict[str, Any]
+    if actual is not None:
+        actual_to_write = actual
+    else:
+        actual_to_write = {"file": src, "issues": [], "raw": raw}
+    if write_json(actual_path, actual_to_write):
+        print(f"Wrote actual result: {actual_path}")
+    else:
+        print(f"Failed to write actual result: {actual_path}", file=sys.stderr)
+
+    expected_path = expected_path_for(src)
+    expected = load_json(expected_path)
 
-    if not api_key:
-        print("Warning: OPENAI_API_KEY is not set; requests will likely fail.", file=sys.stderr)
+    if expected is None:
+        # Create expected file from LLM output
+        if write_json(expected_path, actual_to_write):
+            status, note = "missing", "Expected missing: created from LLM output"
+        else:
+            status, note = "fail", "Failed to create expected result file"
+    else:
+        ok, note = compare_results(actual, expected)
+        status = "pass" if ok else "fail"
+    print(note)
+    print(f"Expected file: {expected_path}")
+    print(f"Result: {'FAIL' if status == 'fail' else 'PASS'}")
+    return status
 
-    client = openai.OpenAI(api_key=api_key, base_url=base_url)
 
+def run_scan(client: Any, model: str) -> None:
+    """Analyze every source file under the tests directory and print a summary."""
     # Batch mode: iterate all files in tests/java (or test/java)
     test_dir = find_test_dir()
     print(f"Scanning directory: {test_dir}")
@@ -243,54 +371,36 @@ def main() -> None:
     failed = 0
     missing = 0
 
-    for src in iter_source_files(test_dir):
-        total += 1
-        print(f"\n=== Analyzing: {src} ===")
-        actual, raw = analyze_file(src, client, model)
-        # Always write the actual result for each file
-        actual_path = actual_path_for(src)
-        actual_to_write: Dict[str, Any]
-        if actual is not None:
-            actual_to_write = actual
-        else:
-            actual_to_write = {"file": src, "issues": [], "raw": raw}
-        if write_json(actual_path, actual_to_write):
-            print(f"Wrote actual result: {actual_path}")
-        else:
-            print(f"Failed to write actual result: {actual_path}", file=sys.stderr)
-
-        expected_path = expected_path_for(src)
-        expected = load_json(expected_path)
-
-        if expected is None:
-            # Create expected file from LLM output
-            to_write: Dict[str, Any]
-            if actual is not None:
-                to_write = actual
-            else:
-                to_write = {"file": src, "issues": [], "raw": raw}
-            if write_json(expected_path, to_write):
-                missing += 1  # count how many were created
-                ok, note = True, "Expected missing: created from LLM output"
-            else:
-                ok, note = False, "Failed to create expected result file"
-            if ok:
-                passed += 1
-            else:
-                failed += 1
-            print(note)
-            print(f"Expected file: {expected_path}")
-            print(f"Result: {'PASS' if ok else 'FAIL'}")
-            continue
-
-        ok, note = compare_results(actual, expected)
-        if ok:
-            passed += 1
-        else:
-            failed += 1
-        print(note)
-        print(f"Expected file: {expected_path}")
-        print(f"Result: {'PASS' if ok else 'FAIL'}")
+    # LLM requests are independent per file; run them concurrently and do the
+    # bookkeeping (writes, comparison, counters) here as results arrive
+    concurrency = max(1, int(os.getenv("SCAN_CONCURRENCY", "8")))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(analyze_file, src, client, model): src
+            for src in iter_source_files(test_dir)
+        }
+        try:
+            for future in as_completed(futures):
+                src = futures[future]
+                print(f"\n=== Result for: {src} ===")
+                try:
+                    actual, raw = future.result()
+                except Exception as e:
+                    # A permanent API error (or retries running out) fails only this file
+                    status = report_failure(src, e)
+                else:
+                    status = report_result(src, actual, raw)
+                total += 1
+                if status == "fail":
+                    failed += 1
+                else:
+                    passed += 1
+                    if status == "missing":
+                        missing += 1
+        except BaseException:
+            # Do not send (and pay for) the requests that have not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     print("\n===== Summary =====")
     elapsed = time.time() - start_time
@@ -301,5 +411,27 @@ def main() -> None:
     print(f"Total time: {elapsed:.2f}s")
 
 
+def main() -> None:
+    model = os.getenv("MODEL", "gpt-4o-mini")
+    api_key = os.getenv("OPENAI_API_KEY")
+    base_url = os.getenv("OPENAI_BASE_URL", "https://litellm.labs.jb.gg/")
+
+    if not api_key:
+        print("Warning: OPENAI_API_KEY is not set; requests will likely fail.", file=sys.stderr)
+
+    http_client = build_http_client()
+    try:
+        # Retries are handled by create_completion(), so disable the SDK's own
+        client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0,
+        )
+        run_scan(client, model)
+    finally:
+        http_client.close()
+
+
 if __name__ == "__main__":
     main()
@@ -27,21 +27,39 @@ Environment:
 - Optionally override the prompts directory with PROMPTS_DIR env var; the script
   expects security_prompt.md to be inside that directory. If the prompt
   file is missing or unreadable, the script exits with an error.
+- SCAN_WORKERS sets how many files are analyzed in parallel (default: CPU count).
 """
 from __future__ import annotations
 
+import atexit
 import os
+import shutil
 import sys
 import subprocess
+import tempfile
+import threading
 import time
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Iterator, List, Optional, Tuple
 
+from fsutil import iter_java_files
+
+try:
+    import ijson  # optional: streams SARIF results instead of loading the whole report
+except ImportError:
+    ijson = None
 
 # Allow overriding via environment variables; fallback to defaults
 SCRIPT_PATH = os.getenv("SCRIPT_PATH")
 API_KEY = os.getenv("API_KEY")
 PROMPT_FILE = os.getenv("PROMPT_FILE", "security_prompt.md")
 
+# Per-thread state: each worker reuses one result directory for all its files
+_worker = threading.local()
+
+# Bytes read per pread() when looking for the first line of a result file
+_PREFIX = 4096
+
 def find_test_dir() -> str:
     """Return the root tests directory, preferring 'tests' then 'test'."""
     for p in ("tests/fraunhofer-suite", "test/fraunhofer-suite"):
@@ -50,159 +68,163 @@ def find_test_dir() -> str:
     return "tests"
 
 
-def iter_source_files(root: str):
-    """Yield .java source files under root recursively."""
-    for dirpath, _dirnames, filenames in os.walk(root):
-        for name in filenames:
-            if name.lower().endswith(".java"):
-                yield os.path.join(dirpath, name)
-
-
-def expected_path_for(src_path: str) -> str:
-    in_dir = os.path.dirname(src_path)
-    base = os.path.splitext(os.path.basename(src_path))[0]
-    return os.path.join(in_dir, f"{base}-expected.txt")
-
-
-def actual_path_for(src_path: str) -> str:
-    in_dir = os.path.dirname(src_path)
-    base = os.path.splitext(os.path.basename(src_path))[0]
-    return os.path.join(in_dir, f"{base}-actual.txt")
+def iter_source_files(root: str) -> Iterator[str]:
+    """Yield .java source files under root recursively (extension matched case-insensitively)."""
+    return iter_java_files(root, ignore_case=True)
 
 
-def read_text(path: str) -> Optional[str]:
-    try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            return f.read()
-    except Exception:
-        return None
+def split_src(src_path: str) -> Tuple[str, str]:
+    """Return (directory, base name without extension) of a source file."""
+    in_dir, name = os.path.split(src_path)
+    base, _ = os.path.splitext(name)
+    return in_dir, base
 
 
-def write_text(path: str, content: str) -> bool:
+def copy_file(src_path: str, dest_path: str) -> bool:
+    """Copy src_path to dest_path; the kernel moves the data (sendfile) where supported."""
     try:
-        # Ensure parent directory exists
-        parent = os.path.dirname(path)
-        if parent and not os.path.isdir(parent):
-            os.makedirs(parent, exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        shutil.copyfile(src_path, dest_path)
         return True
     except Exception as e:
-        print(f"Error writing to {path}: {e}", file=sys.stderr)
+        print(f"Error writing to {dest_path}: {e}", file=sys.stderr)
         return False
 
 
 def ensure_prompt_path() -> str:
+    """Return the absolute path of the prompt file, exiting if it is missing or unreadable."""
     prompts_dir = os.getenv("PROMPTS_DIR", os.path.join(os.path.dirname(__file__), "prompts"))
     prompt_path = os.path.join(prompts_dir, PROMPT_FILE)
-    try:
-        with open(prompt_path, "r", encoding="utf-8") as _:
-            pass
-    except Exception:
+    if not (os.path.isfile(prompt_path) and os.access(prompt_path, os.R_OK)):
         print(f"Error: prompt file missing or unreadable: {prompt_path}", file=sys.stderr)
         sys.exit(1)
-    return prompt_path
+    return os.path.abspath(prompt_path)
+
 
+def iter_sarif_results(sarif_path: str) -> Iterator[Any]:
+    """Yield the entries of runs[].results[] from a SARIF file.
 
-def run_external_review(src: str, prompt_path: str, out_path: str) -> Tuple[bool, str]:
+    With ijson installed (it picks its C yajl2 backend when available) the
+    results are parsed incrementally and the full report is never held in
+    memory; otherwise the file is loaded with the standard json module.
+    """
+    if ijson is not None:
+        with open(sarif_path, "rb") as f:
+            yield from ijson.items(f, "runs.item.results.item")
+        return
+
+    import json as _json
+    with open(sarif_path, "r", encoding="utf-8", errors="replace") as f:
+        sarif_data = _json.load(f)
+    runs = sarif_data.get("runs", []) if isinstance(sarif_data, dict) else []
+    for run in runs:
+        yield from (run.get("results", []) if isinstance(run, dict) else [])
+
+
+def _worker_result_dir(scan_tmp: str) -> str:
+    """Return the calling thread's result directory under scan_tmp, creating it on first use."""
+    path = getattr(_worker, "result_dir", None)
+    if path is None or os.path.dirname(path) != scan_tmp:
+        path = tempfile.mkdtemp(dir=scan_tmp)
+        _worker.result_dir = path
+    return path
+
+
+def _clear_result(sarif_path: str) -> None:
+    """Remove the tool's SARIF output so the result directory can be reused."""
+    try:
+        os.unlink(sarif_path)
+    except OSError:
+        pass
+
+
+def run_external_review(src: str, prompt_path: str, out_path: str, scan_tmp: str) -> Tuple[bool, str]:
     """Run the external shell script to produce the analysis output.
 
+    prompt_path must already be absolute (as returned by ensure_prompt_path()).
+
     Now the external tool expects --result to be a DIRECTORY and writes a file
     named 'security-review.sarif' inside it. This function will:
-      - create a temporary result directory
-      - run the tool with --result pointing to that temp directory
-      - copy '<temp>/security-review.sarif' to 'out_path'
-      - remove the temp directory afterwards
+      - reuse this worker thread's result directory under scan_tmp
+      - run the tool with --result pointing to that directory
+      - parse '<dir>/security-review.sarif' into a file:line list at 'out_path'
+      - delete the SARIF file afterwards so the directory is clean for the next run
 
     Returns (ok, note). Stdout from the external tool is intentionally suppressed
     and not propagated to this script's stdout to keep output clean.
     """
-    import tempfile
-    import shutil
-
     out_path_abs = os.path.abspath(out_path)
     src_abs = os.path.abspath(src)
-    prompt_abs = os.path.abspath(prompt_path)
 
-    # Create a temporary directory for the tool's output
+    # Result directory for the tool's output, shared by this thread's runs
     try:
-        temp_dir = tempfile.mkdtemp(prefix="secscan_")
+        temp_dir = _worker_result_dir(scan_tmp)
     except Exception as e:
         return False, f"Failed to create temporary directory: {e}"
+    sarif_src = os.path.join(temp_dir, "security-review.sarif")
 
     cmd = [
         SCRIPT_PATH,
         API_KEY,
         f"--repo={src_abs}",
-        f"--customPrompt={prompt_abs}",
+        f"--customPrompt={prompt_path}",
         f"--result={os.path.abspath(temp_dir)}",
         "--shouldProduceSarif=true"
     ]
     try:
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # Stdout is never used, so send it to /dev/null instead of buffering it;
+        # stderr is kept as bytes and only decoded for a failure report
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     except FileNotFoundError:
-        # Cleanup temp dir before returning
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
         return False, f"External script not found: {SCRIPT_PATH}"
     except Exception as e:
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
         return False, f"Failed to start external script: {e}"
 
     if proc.returncode != 0:
         note = (
             f"External script failed with code {proc.returncode}.\n"
-            f"STDERR:\n{proc.stderr}"
+            f"STDERR:\n{proc.stderr.decode('utf-8', 'replace')}"
         )
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+        _clear_result(sarif_src)
         return False, note
 
     # After successful run, parse the SARIF result and write a simple file:line list to out_path
-    sarif_src = os.path.join(temp_dir, "security-review.sarif")
     if not os.path.isfile(sarif_src):
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
         return False, f"Expected result file not found: {sarif_src}"
 
     # Parse SARIF and prepare output lines
     try:
-        import json as _json
-        with open(sarif_src, "r", encoding="utf-8", errors="replace") as _f:
-            sarif_data = _json.load(_f)
         lines_set = set()
-        runs = sarif_data.get("runs", []) if isinstance(sarif_data, dict) else []
-        for run in runs:
-            results = run.get("results", []) if isinstance(run, dict) else []
-            for res in results:
-                locs = res.get("locations", []) if isinstance(res, dict) else []
-                for loc in locs:
-                    phys = (loc or {}).get("physicalLocation", {})
-                    region = phys.get("region", {})
-                    start_line = region.get("startLine")
-                    art = phys.get("artifactLocation", {})
-                    uri = art.get("uri") or art.get("uriBaseId") or ""
-                    # The URI may be a path or URI; take the basename
-                    base = os.path.basename(uri) if isinstance(uri, str) else ""
-                    if base and isinstance(start_line, int):
-                        lines_set.add((base, int(start_line)))
-        # Sort by filename then line
-        sorted_lines = sorted(lines_set, key=lambda t: (t[0], t[1]))
-        output_text = "\n".join(f"{fname}:{ln}" for fname, ln in sorted_lines)
+        uri_cache = {}  # uri -> basename; results usually repeat the same few files
+        # Hot loop: bind lookups to locals; malformed entries are skipped
+        # one by one so they do not discard the file's other findings
+        _add = lines_set.add
+        _cached = uri_cache.get
+        _basename = os.path.basename
+        for res in iter_sarif_results(sarif_src):
+            if not isinstance(res, dict):
+                continue
+            for loc in res.get("locations") or ():
+                if not isinstance(loc, dict):
+                    continue
+                phys = loc.get("physicalLocation") or {}
+                start_line = (phys.get("region") or {}).get("startLine")
+                if not isinstance(start_line, int):
+                    continue
+                art = phys.get("artifactLocation") or {}
+                uri = art.get("uri") or art.get("uriBaseId") or ""
+                if not isinstance(uri, str):
+                    continue
+                # The URI may be a path or URI; take the basename
+                base = _cached(uri)
+                if base is None:
+                    base = uri_cache[uri] = _basename(uri)
+                if base:
+                    _add((base, start_line))
+        # Sort by filename then line (natural tuple order)
+        sorted_lines = sorted(lines_set)
+        del lines_set
     except Exception as e:
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+        _clear_result(sarif_src)
         return False, f"Failed to parse SARIF: {e}"
 
     try:
@@ -210,44 +232,131 @@ def run_external_review(src: str, prompt_path: str, out_path: str) -> Tuple[bool
         dest_parent = os.path.dirname(out_path_abs)
         if dest_parent and not os.path.isdir(dest_parent):
             os.makedirs(dest_parent, exist_ok=True)
-        with open(out_path_abs, "w", encoding="utf-8") as outf:
-            outf.write(output_text)
+        # Stream the entries into a large binary buffer instead of joining them
+        # into one string first; lines are separated, not terminated, by '\n'
+        with open(out_path_abs, "wb", buffering=1 << 20) as outf:
+            write = outf.write
+            sep = b""
+            for fname, ln in sorted_lines:
+                write(b"%s%s:%d" % (sep, fname.encode("utf-8"), ln))
+                sep = b"\n"
     except Exception as e:
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+        _clear_result(sarif_src)
         return False, f"Failed to write parsed results: {e}"
 
-    # Cleanup temp directory
-    try:
-        shutil.rmtree(temp_dir, ignore_errors=True)
-    except Exception:
-        pass
+    # Leave the result directory empty for the next run
+    _clear_result(sarif_src)
 
     # Do not expose stdout of the tool
     return True, ""
 
 
-def compare_text(actual_text: Optional[str], expected_text: Optional[str]) -> Tuple[bool, str]:
-    """Compare only the first line of actual and expected text.
+def read_first_line(path: str) -> Optional[bytes]:
+    """Return the first line of a file without its line terminator, or None if unreadable.
+
+    Reads a bounded prefix with pread() and only continues past it when the
+    first line is longer, so the rest of the file is never read.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, _PREFIX, offset)
+            nl = chunk.find(b"\n")
+            if nl >= 0:
+                chunks.append(chunk[:nl])
+                break
+            chunks.append(chunk)
+            if len(chunk) < _PREFIX:  # end of file
+                break
+            offset += len(chunk)
+        return b"".join(chunks).rstrip(b"\r")
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def compare_text(a_first: Optional[bytes], e_first: Optional[bytes]) -> Tuple[bool, str]:
+    """Compare the first lines of actual and expected output (see read_first_line()).
 
     Returns (ok, note). If either file is missing/unreadable, returns a failure.
     Whitespace differences at line ends are ignored (first line is compared after rstrip()).
     """
-    if expected_text is None:
+    if e_first is None:
         return False, "Expected result file missing or unreadable"
-    if actual_text is None:
+    if a_first is None:
         return False, "Actual result file missing or unreadable"
 
-    # Extract first lines (or empty string if file is empty)
-    a_first = actual_text.splitlines()[0] if actual_text.splitlines() else ""
-    e_first = expected_text.splitlines()[0] if expected_text.splitlines() else ""
-
     if a_first.rstrip() == e_first.rstrip():
         return True, "First line matches"
     else:
-        return False, f"First-line mismatch: actual='{a_first}' expected='{e_first}'"
+        a_shown = a_first.decode("utf-8", "replace")
+        e_shown = e_first.decode("utf-8", "replace")
+        return False, f"First-line mismatch: actual='{a_shown}' expected='{e_shown}'"
+
+
+def _process_one(src: str, prompt_path: str, scan_tmp: str) -> Tuple[str, List[str]]:
+    """Analyze one source file and compare the result with its expected file.
+
+    Returns (status, lines) where status is "pass", "fail" or "missing"
+    (expected file created from actual, counted as a pass). Output lines are
+    returned rather than printed so parallel runs do not interleave.
+    """
+    out = [f"\n=== Analyzing: {src} ==="]
+
+    # Both result files sit next to the source; split its path only once
+    in_dir, base = split_src(src)
+    actual_path = os.path.abspath(os.path.join(in_dir, f"{base}-actual.txt"))
+    expected_path = os.path.join(in_dir, f"{base}-expected.txt")
+
+    # Produce actual output via external script; it creates the parent
+    # directory itself and reports write failures through (ok_run, note)
+    ok_run, note = run_external_review(os.path.abspath(src), prompt_path, actual_path, scan_tmp)
+    if not ok_run:
+        out.append(note)
+        out.append(f"Result: FAIL")
+        return "fail", out
+    else:
+        # Script may output some useful info
+        if note:
+            out.append(note)
+
+    # Only the first line of each result is compared
+    actual_first = read_first_line(actual_path)
+    if actual_first is None:
+        out.append(f"Failed to read actual result: {actual_path}")
+        out.append("Result: FAIL")
+        return "fail", out
+    else:
+        out.append(f"Wrote actual result: {actual_path}")
+
+    expected_first = read_first_line(expected_path)
+
+    if expected_first is None:
+        # Create expected from actual. Copy rather than hardlink: the next run
+        # truncates and rewrites the actual file in place, which would also
+        # overwrite a linked expected file
+        if copy_file(actual_path, expected_path):
+            out.append("Expected missing: created from actual output")
+            out.append(f"Expected file: {expected_path}")
+            out.append("Result: PASS")
+            return "missing", out
+        else:
+            out.append("Failed to create expected result file")
+            out.append(f"Expected file: {expected_path}")
+            out.append("Result: FAIL")
+            return "fail", out
+
+    ok, cmp_note = compare_text(actual_first, expected_first)
+    out.append(cmp_note)
+    out.append(f"Expected file: {expected_path}")
+    out.append(f"Result: {'PASS' if ok else 'FAIL'}")
+    return ("pass" if ok else "fail"), out
 
 
 def main() -> None:
@@ -264,75 +373,37 @@ def main() -> None:
         test_dir = find_test_dir()
     print(f"Scanning directory: {test_dir}")
 
+    # One temporary root for the whole scan; removed when the process exits
+    try:
+        scan_tmp = tempfile.mkdtemp(prefix="secscan_")
+    except Exception as e:
+        print(f"Error: failed to create temporary directory: {e}", file=sys.stderr)
+        sys.exit(1)
+    atexit.register(shutil.rmtree, scan_tmp, ignore_errors=True)
+
     start_time = time.time()
     total = passed = failed = missing = 0
 
-    for src in iter_source_files(test_dir):
-        total += 1
-        print(f"\n=== Analyzing: {src} ===")
-
-        # Produce actual output via external script
-        actual_path = os.path.abspath(actual_path_for(src))
-        # Ensure the actual output path exists (create parent dirs and empty file)
+    # Each file is an independent external run; execute them in parallel and
+    # print each file's report as it completes
+    workers = max(1, int(os.getenv("SCAN_WORKERS", str(os.cpu_count() or 4))))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_process_one, src, prompt_path, scan_tmp) for src in iter_source_files(test_dir)]
         try:
-            parent = os.path.dirname(actual_path)
-            if parent and not os.path.isdir(parent):
-                os.makedirs(parent, exist_ok=True)
-            if not os.path.exists(actual_path):
-                with open(actual_path, "a", encoding="utf-8"):
-                    pass
-        except Exception as e:
-            failed += 1
-            print(f"Failed to prepare actual output path '{actual_path}': {e}")
-            print("Result: FAIL")
-            continue
-        ok_run, note = run_external_review(os.path.abspath(src), prompt_path, actual_path)
-        if not ok_run:
-            failed += 1
-            print(note)
-            print(f"Result: FAIL")
-            continue
-        else:
-            # Script may output some useful info
-            if note:
-                print(note)
-
-        # Read actual output
-        actual_text = read_text(actual_path)
-        if actual_text is None:
-            failed += 1
-            print(f"Failed to read actual result: {actual_path}")
-            print("Result: FAIL")
-            continue
-        else:
-            print(f"Wrote actual result: {actual_path}")
-
-        expected_path = expected_path_for(src)
-        expected_text = read_text(expected_path)
-
-        if expected_text is None:
-            # Create expected from actual
-            if write_text(expected_path, actual_text):
-                missing += 1
-                passed += 1
-                print("Expected missing: created from actual output")
-                print(f"Expected file: {expected_path}")
-                print("Result: PASS")
-            else:
-                failed += 1
-                print("Failed to create expected result file")
-                print(f"Expected file: {expected_path}")
-                print("Result: FAIL")
-            continue
-
-        ok, cmp_note = compare_text(actual_text, expected_text)
-        if ok:
-            passed += 1
-        else:
-            failed += 1
-        print(cmp_note)
-        print(f"Expected file: {expected_path}")
-        print(f"Result: {'PASS' if ok else 'FAIL'}")
+            for future in as_completed(futures):
+                status, lines = future.result()
+                total += 1
+                if status == "fail":
+                    failed += 1
+                else:
+                    passed += 1
+                    if status == "missing":
+                        missing += 1
+                print("\n".join(lines))
+        except BaseException:
+            # Do not start (and pay for) the reviews still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     print("\n===== Summary =====")
     elapsed = time.time() - start_time
@@ -2,40 +2,45 @@
 import json
 import os
 import sys
-from typing import Any, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Tuple
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
 TEST_DIR = os.path.join(ROOT, "tests", "java")
 
 
-def strip_recommendation(obj: Dict[str, Any]) -> Dict[str, Any]:
+def strip_recommendation(obj: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Remove "recommendation" from every issue; return (obj, changed)."""
+    changed = False
     if not isinstance(obj, dict):
-        return obj
+        return obj, changed
     issues = obj.get("issues")
     if isinstance(issues, list):
         for it in issues:
             if isinstance(it, dict) and "recommendation" in it:
-                it.pop("recommendation", None)
-    return obj
+                del it["recommendation"]
+                changed = True
+    return obj, changed
 
 
 def process_file(path: str) -> bool:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            raw = f.read()
+        if b'"recommendation"' not in raw:
+            # Nothing to strip; skip parsing entirely
+            return True
+        data = json.loads(raw)
     except Exception as e:
         print(f"Skipping {path}: failed to read/parse JSON: {e}", file=sys.stderr)
         return False
-    before = json.dumps(data, sort_keys=True)
-    data = strip_recommendation(data)
-    after = json.dumps(data, sort_keys=True)
-    if before == after:
-        # no change
+    data, changed = strip_recommendation(data)
+    if not changed:
         return True
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            f.write("\n")
+        payload = (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(payload)
         print(f"Updated {path}")
         return True
     except Exception as e:
@@ -47,13 +52,15 @@ def main() -> int:
     if not os.path.isdir(TEST_DIR):
         print(f"Test dir not found: {TEST_DIR}", file=sys.stderr)
         return 1
-    ok = True
-    for name in os.listdir(TEST_DIR):
-        if not (name.endswith("-expected.json") or name.endswith("-actual.json")):
-            continue
-        path = os.path.join(TEST_DIR, name)
-        if not process_file(path):
-            ok = False
+    paths = [
+        os.path.join(TEST_DIR, name)
+        for name in os.listdir(TEST_DIR)
+        if name.endswith(("-expected.json", "-actual.json"))
+    ]
+    # Parsing and serializing JSON is CPU-bound, so spread files over processes
+    with ProcessPoolExecutor() as executor:
+        results = list(executor.map(process_file, paths, chunksize=16))
+    ok = all(results)
     return 0 if ok else 2
 
 